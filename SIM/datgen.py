@@ -1,8 +1,13 @@
-import geopandas as gpd
 import pandas as pd
+import pyogrio
 
-# Load the data
-cities = gpd.read_file("ne_10m_populated_places.zip")
+# Load only the attribute columns we use; geometry is not needed since the
+# table already carries LATITUDE/LONGITUDE
+cities = pyogrio.read_dataframe(
+    "ne_10m_populated_places.zip",
+    columns=["NAME_EN", "ADM0NAME", "LATITUDE", "LONGITUDE", "POP_MAX"],
+    read_geometry=False,
+)
 
 # Select and rename relevant columns
 cities_df = cities[["NAME_EN", "ADM0NAME", "LATITUDE", "LONGITUDE", "POP_MAX"]].rename(
@@ -21,10 +26,12 @@ cities_df = cities_df[cities_df["population"] > 800000]
 # Sort by population descending
 cities_df = cities_df.sort_values("population", ascending=False)
 
-# Save to CSV
+# Save to CSV, plus a Parquet copy with a categorical country column for
+# faster, smaller loads in the data collectors
 cities_df.to_csv("cities.csv", index=False)
+cities_df.astype({"country": "category"}).to_parquet("cities.parquet", index=False)
 
 # Print summary
-print(f"Saved {len(cities_df)} cities to cities.csv")
+print(f"Saved {len(cities_df)} cities to cities.csv and cities.parquet")
 print("\nTop 5 cities by population:")
 print(cities_df.head())
@@ -1,5 +1,10 @@
 import tensorflow as tf
 import coremltools as ct  # For M1 optimization
+from coremltools.optimize.coreml import (
+    OpPalettizerConfig,
+    OptimizationConfig,
+    palettize_weights,
+)
 
 
 class RoadNetworkGenerator:
@@ -16,29 +21,58 @@ class RoadNetworkGenerator:
         # Load TF model
         tf_model = tf.keras.models.load_model(model_path)
 
-        # Convert to Core ML
+        # Convert to Core ML in FP16 (what the Neural Engine runs), with the
+        # (x / 127.5) - 1 normalization folded into the image input
         mlmodel = ct.convert(
             tf_model,
-            inputs=[ct.ImageType(shape=(1, 256, 256, 1))],
+            inputs=[
+                ct.ImageType(
+                    shape=(1, 256, 256, 1),
+                    scale=1 / 127.5,
+                    bias=[-1],
+                    color_layout=ct.colorlayout.GRAYSCALE,
+                )
+            ],
+            compute_precision=ct.precision.FLOAT16,
             compute_units=ct.ComputeUnit.ALL,  # Use all available compute units
+            minimum_deployment_target=ct.target.macOS13,
         )
 
+        # Compress weights to a 6-bit k-means palette
+        config = OptimizationConfig(
+            global_config=OpPalettizerConfig(mode="kmeans", nbits=6)
+        )
+        mlmodel = palettize_weights(mlmodel, config)
+
         return mlmodel
 
     def generate(self, sketch_input):
         """Generate road network from sketch"""
-        # Preprocess input
-        processed_input = self._preprocess(sketch_input)
-
         # Generate output
         if self.device == "mps":
-            output = self.model.predict({"input_1": processed_input})
+            # Normalization is baked into the Core ML image input
+            output = self.model.predict({"input_1": sketch_input})
         else:
+            processed_input = self._preprocess(sketch_input)
             output = self.model(processed_input, training=False)
 
         # Postprocess output
         return self._postprocess(output)
 
+    def generate_batch(self, sketch_inputs):
+        """Generate road networks for several sketches in one submission"""
+        if self.device == "mps":
+            # A list of inputs runs as a single Core ML batch prediction, which
+            # keeps the ANE/GPU busy instead of idling between calls
+            outputs = self.model.predict([{"input_1": s} for s in sketch_inputs])
+        else:
+            batch = tf.concat([self._preprocess(s) for s in sketch_inputs], axis=0)
+            outputs = tf.split(
+                self.model(batch, training=False), len(sketch_inputs), axis=0
+            )
+
+        return [self._postprocess(output) for output in outputs]
+
     def _preprocess(self, input_image):
         # Normalize and prepare input
         input_image = tf.cast(input_image, tf.float32)
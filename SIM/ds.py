@@ -1,19 +1,23 @@
 import osmnx as ox
 import networkx as nx
-import matplotlib.pyplot as plt
 import pandas as pd
 from pathlib import Path
-from shapely.geometry import box, Point, LineString
+import shapely
+from shapely.geometry import box
 import random
-from PIL import Image
+from PIL import Image, ImageColor, ImageDraw
 from tqdm import tqdm
 import warnings
 import time
 import multiprocessing
-from multiprocessing import Pool
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from multiprocessing import get_context
 import numpy as np
 from typing import Dict, List, Tuple
 import traceback
+import math
+from datetime import timedelta
+import requests_cache
 
 warnings.filterwarnings("ignore")
 
@@ -65,10 +69,35 @@ class RoadProperties:
     }
 
 
+# Road styles frozen into tables indexed by a small road-type id, so the
+# per-edge render loop does an index instead of dict lookups and colour parsing.
+# Ids follow ROAD_HIERARCHY order, i.e. most important road type first.
+ROAD_TYPES = tuple(RoadProperties.ROAD_HIERARCHY)
+ROAD_TYPE_ID = {name: i for i, name in enumerate(ROAD_TYPES)}
+UNCLASSIFIED_ID = ROAD_TYPE_ID["unclassified"]
+ROAD_WIDTHS = np.array([p["width"] for p in RoadProperties.ROAD_HIERARCHY.values()])
+ROAD_RGB = tuple(
+    ImageColor.getrgb(p["color"]) for p in RoadProperties.ROAD_HIERARCHY.values()
+)
+
+CONTROL_RGB = {
+    road_type: ImageColor.getrgb(color)
+    for road_type, color in {
+        "motorway": "red",
+        "trunk": "orange",
+        "primary": "yellow",
+        "secondary": "green",
+        "tertiary": "blue",
+        "residential": "purple",
+        "unclassified": "brown",
+    }.items()
+}
+
+
 ########################################
 # Generate Road Style for CONTROL image
 ########################################
-def get_control_line_style(data: dict) -> Tuple[str, float, str]:
+def get_control_line_style(data: dict) -> Tuple[Tuple[int, int, int], float, str]:
     """Safely generate line style for road network control image."""
     try:
         # Safely extract highway type
@@ -87,16 +116,7 @@ def get_control_line_style(data: dict) -> Tuple[str, float, str]:
         oneway = str(data.get("oneway", "no")).lower()
         roundabout = str(data.get("junction", "")).lower() == "roundabout"
 
-        color_map = {
-            "motorway": "red",
-            "trunk": "orange",
-            "primary": "yellow",
-            "secondary": "green",
-            "tertiary": "blue",
-            "residential": "purple",
-            "unclassified": "brown",
-        }
-        color = color_map.get(highway_type, "black")
+        color = CONTROL_RGB.get(highway_type, (0, 0, 0))
 
         # Base linewidth depends on lanes
         base_linewidth = 1.0 + 0.3 * lanes
@@ -120,27 +140,35 @@ def get_control_line_style(data: dict) -> Tuple[str, float, str]:
 
     except Exception as e:
         print(f"Error in get_control_line_style: {e}")
-        return ("black", 1.0, "-")
+        return ((0, 0, 0), 1.0, "-")
 
 
 ########################################
 # Border Nodes & Connectivity
 ########################################
+def get_node_coords(G: nx.Graph) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return (node_ids, xs, ys) arrays, cached on the graph after the first call."""
+    if "_node_coords" not in G.graph:
+        n = G.number_of_nodes()
+        nodes = np.fromiter(G.nodes(), dtype=np.int64, count=n)
+        xs = np.fromiter((d["x"] for _, d in G.nodes(data=True)), np.float64, n)
+        ys = np.fromiter((d["y"] for _, d in G.nodes(data=True)), np.float64, n)
+        G.graph["_node_coords"] = (nodes, xs, ys)
+    return G.graph["_node_coords"]
+
+
 def get_border_nodes(G: nx.Graph, polygon) -> List[int]:
     """Find nodes at the border of a given polygon."""
     minx, miny, maxx, maxy = polygon.bounds
     margin = 0.0001
-    border_nodes = []
-    for node, data in G.nodes(data=True):
-        lat, lon = data["y"], data["x"]
-        if (
-            abs(lat - miny) < margin
-            or abs(lat - maxy) < margin
-            or abs(lon - minx) < margin
-            or abs(lon - maxx) < margin
-        ):
-            border_nodes.append(node)
-    return border_nodes
+    nodes, xs, ys = get_node_coords(G)
+    mask = (
+        (np.abs(ys - miny) < margin)
+        | (np.abs(ys - maxy) < margin)
+        | (np.abs(xs - minx) < margin)
+        | (np.abs(xs - maxx) < margin)
+    )
+    return nodes[mask].tolist()
 
 
 def validate_network_connectivity(G: nx.Graph, polygon) -> bool:
@@ -148,17 +176,11 @@ def validate_network_connectivity(G: nx.Graph, polygon) -> bool:
     border_nodes = get_border_nodes(G, polygon)
     if len(border_nodes) < 2:
         return False
-    if not nx.is_connected(G):
-        return False
-    for i, start in enumerate(border_nodes[:-1]):
-        path_exists = False
-        for end in border_nodes[i + 1 :]:
-            if nx.has_path(G, start, end):
-                path_exists = True
-                break
-        if not path_exists:
-            return False
-    return True
+    # One component labelling instead of a has_path BFS per border pair
+    node2cc = {
+        n: c for c, nodes in enumerate(nx.connected_components(G)) for n in nodes
+    }
+    return len({node2cc[n] for n in border_nodes}) == 1
 
 
 ########################################
@@ -166,93 +188,234 @@ def validate_network_connectivity(G: nx.Graph, polygon) -> bool:
 ########################################
 def generate_properties(G: nx.Graph) -> List[Dict]:
     """Generate random property points along the road network."""
-    properties = []
-    edges = list(G.edges(data=True))
+    edges = list(G.edges())
     num_properties = max(5, len(edges) // 3)
+    rng = np.random.default_rng()
 
-    for _ in range(num_properties):
-        edge = random.choice(edges)
-        start = Point(G.nodes[edge[0]]["x"], G.nodes[edge[0]]["y"])
-        end = Point(G.nodes[edge[1]]["x"], G.nodes[edge[1]]["y"])
-        line = LineString([start, end])
-
-        distance = random.random()
-        point = line.interpolate(distance, normalized=True)
-
-        prop_type = random.choices(
-            list(RoadProperties.PROPERTY_TYPES.keys()),
-            weights=[p["weight"] for p in RoadProperties.PROPERTY_TYPES.values()],
-        )[0]
-
-        properties.append(
-            {
-                "type": prop_type,
-                "position": (point.x, point.y),
-                "size": random.randint(1, 5),
-                "edge": edge[:2],
-            }
+    # (x_u, y_u, x_v, y_v) per edge; each property is a lerp along a random edge
+    edge_arr = np.array(
+        [
+            (G.nodes[u]["x"], G.nodes[u]["y"], G.nodes[v]["x"], G.nodes[v]["y"])
+            for u, v in edges
+        ]
+    )
+    idx = rng.integers(0, len(edges), num_properties)
+    t = rng.random(num_properties)
+    start, end = edge_arr[idx, :2], edge_arr[idx, 2:]
+    positions = start + t[:, None] * (end - start)
+
+    type_names = list(RoadProperties.PROPERTY_TYPES)
+    weights = np.array([p["weight"] for p in RoadProperties.PROPERTY_TYPES.values()])
+    types = rng.choice(len(type_names), num_properties, p=weights / weights.sum())
+    sizes = rng.integers(1, 6, num_properties)
+
+    return [
+        {
+            "type": type_names[type_id],
+            "position": tuple(position),
+            "size": size,
+            "edge": edges[edge_id],
+        }
+        for type_id, position, size, edge_id in zip(
+            types.tolist(), positions.tolist(), sizes.tolist(), idx.tolist()
         )
-    return properties
+    ]
 
 
 ########################################
 # Process Single City Sample
 ########################################
-def get_road_type(highway_data):
-    """Safely extract road type from highway data."""
+def get_road_type(highway_data) -> int:
+    """Safely extract the road-type id (index into ROAD_TYPES) from highway data."""
     if isinstance(highway_data, list):
         # Filter out empty or None values
         highway_data = [str(h).lower().strip() for h in highway_data if h]
-        if not highway_data:
-            return "unclassified"
         # Prioritize most specific road type
-        road_type_priority = [
-            "motorway",
-            "trunk",
-            "primary",
-            "secondary",
-            "tertiary",
-            "residential",
-            "unclassified",
-        ]
-        for road_type in road_type_priority:
+        for road_id, road_type in enumerate(ROAD_TYPES):
             if any(road_type in h for h in highway_data):
-                return road_type
-        return highway_data[0]
+                return road_id
+        return UNCLASSIFIED_ID
 
     # If it's not a list, convert to string
     road_type = str(highway_data).lower().strip()
-    return road_type if road_type in RoadProperties.ROAD_HIERARCHY else "unclassified"
+    return ROAD_TYPE_ID.get(road_type, UNCLASSIFIED_ID)
 
 
-def process_city_sample(args):
-    """Process a single city sample, generating road network and property visualizations."""
+########################################
+# Tile Rasterization
+########################################
+# Line widths are specified in matplotlib points; the old 8in figure saved at
+# dpi=size/8 mapped one point to size/576 pixels, so keep that scale.
+POINTS_PER_TILE = 8 * 72
+
+# #CCCCCC at 50% alpha over a white background
+BUILDING_FILL = "#E6E6E6"
+
+
+def lonlat_to_px(xs, ys, bounds, size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Project lon/lat arrays into pixel coordinates of a size x size tile."""
+    minx, miny, maxx, maxy = bounds
+    px = (np.asarray(xs) - minx) / (maxx - minx) * size
+    py = (maxy - np.asarray(ys)) / (maxy - miny) * size
+    return px, py
+
+
+def project_nodes(G: nx.Graph, bounds, size: int) -> Dict[int, Tuple[float, float]]:
+    """Map every node to its (x, y) pixel position in the tile."""
+    nodes, xs, ys = get_node_coords(G)
+    px, py = lonlat_to_px(xs, ys, bounds, size)
+    return dict(zip(nodes.tolist(), zip(px.tolist(), py.tolist())))
+
+
+def line_width_px(linewidth: float, size: int) -> int:
+    """Convert a matplotlib linewidth (points) to a whole pixel width."""
+    return max(1, int(round(linewidth * size / POINTS_PER_TILE)))
+
+
+def dash_segment(p0, p1, on: float, off: float) -> List[Tuple]:
+    """Split a segment into the visible pieces of an on/off dash pattern."""
+    (x0, y0), (x1, y1) = p0, p1
+    length = math.hypot(x1 - x0, y1 - y0)
+    if length == 0:
+        return []
+    ux, uy = (x1 - x0) / length, (y1 - y0) / length
+    pieces = []
+    t = 0.0
+    while t < length:
+        end = min(t + on, length)
+        pieces.append(((x0 + ux * t, y0 + uy * t), (x0 + ux * end, y0 + uy * end)))
+        t = end + off
+    return pieces
+
+
+def draw_segment(draw: ImageDraw.ImageDraw, p0, p1, fill, width: int, linestyle="-"):
+    """Draw a road segment, emulating matplotlib dash patterns and round caps."""
+    if linestyle == "-":
+        draw.line([p0, p1], fill=fill, width=width)
+        if width > 2:
+            r = width / 2
+            for cx, cy in (p0, p1):
+                draw.ellipse([cx - r, cy - r, cx + r, cy + r], fill=fill)
+        return
+
+    # Dash lengths scale with linewidth, as in matplotlib
+    _, (on, off) = linestyle
+    for a, b in dash_segment(p0, p1, on * width, off * width):
+        draw.line([a, b], fill=fill, width=width)
+
+
+def building_rings_px(buildings, bounds, size: int) -> List[List[float]]:
+    """Exterior rings of all (multi)polygon buildings as flat pixel coordinate lists."""
+    geoms = buildings.geometry.to_numpy()
+    type_ids = shapely.get_type_id(geoms)
+    polygons = np.concatenate(
+        [geoms[type_ids == 3], shapely.get_parts(geoms[type_ids == 6])]
+    )
+    coords, ring_index = shapely.get_coordinates(
+        shapely.get_exterior_ring(polygons), return_index=True
+    )
+    if len(coords) == 0:
+        return []
+
+    px, py = lonlat_to_px(coords[:, 0], coords[:, 1], bounds, size)
+    splits = np.flatnonzero(np.diff(ring_index)) + 1
+    return [
+        ring.ravel().tolist() for ring in np.split(np.column_stack([px, py]), splits)
+    ]
+
+
+# Samples are jittered up to SAMPLE_JITTER around the city centre and extend
+# SAMPLE_DELTA either side, so a box of their sum covers every sample of a city.
+SAMPLE_JITTER = 0.009
+SAMPLE_DELTA = 0.01
+CUSTOM_FILTER = '["highway"~"motorway|trunk|primary|secondary|tertiary|residential|unclassified"]'
+
+
+# Per-process I/O threads so a worker's Overpass queries run concurrently
+_IO_POOL = None
+
+
+def get_io_pool() -> ThreadPoolExecutor:
+    """Return this process's download thread pool, creating it on first use."""
+    global _IO_POOL
+    if _IO_POOL is None:
+        _IO_POOL = ThreadPoolExecutor(max_workers=2)
+    return _IO_POOL
+
+
+def fetch_buildings(city_box):
+    """Download building footprints, or None if the query fails."""
+    # print("Fetching buildings...")
+    try:
+        buildings_city = ox.features.features_from_polygon(
+            city_box, tags={"building": True}
+        )
+        # print(f"Buildings: {len(buildings_city)}")
+    except Exception as buildings_error:
+        print(f"Error fetching buildings: {buildings_error}")
+        buildings_city = None
+    return buildings_city
+
+
+def download_city_data(city):
+    """Download the road network and buildings covering all samples of a city.
+
+    Both queries are issued at once. Only the network is waited for; the
+    buildings come back as a future so control images can render meanwhile.
+    """
+    lat, lon = float(city["lat"]), float(city["lon"])
+    half = SAMPLE_JITTER + SAMPLE_DELTA
+    city_box = box(lon - half, lat - half, lon + half, lat + half)
+
+    io_pool = get_io_pool()
+    graph_future = io_pool.submit(
+        ox.graph_from_polygon,
+        city_box,
+        network_type="all",
+        custom_filter=CUSTOM_FILTER,
+        simplify=True,
+    )
+    buildings_future = io_pool.submit(fetch_buildings, city_box)
+
     try:
-        plt.ioff()  # Turn off interactive plotting
-        city, i, output_dir, size = args
+        G_city = graph_future.result()
+    except Exception as network_error:
+        print(f"Network download error for {city['city']}: {network_error}")
+        return None
+
+    return G_city, buildings_future
+
+
+def process_city_batch(args):
+    """Download a city's data once, then render each of its samples from memory."""
+    city, sample_ids, output_dir, size = args
+    city_data = download_city_data(city)
+    if city_data is None:
+        return [None] * len(sample_ids)
 
+    G_city, buildings_future = city_data
+    return [
+        process_city_sample(city, i, output_dir, size, G_city, buildings_future)
+        for i in sample_ids
+    ]
+
+
+def process_city_sample(city, i, output_dir, size, G_city, buildings_future):
+    """Process a single city sample, generating road network and property visualizations."""
+    try:
         # Safely extract city coordinates
-        lat = float(city["lat"]) + random.uniform(-0.009, 0.009)
-        lon = float(city["lon"]) + random.uniform(-0.009, 0.009)
+        lat = float(city["lat"]) + random.uniform(-SAMPLE_JITTER, SAMPLE_JITTER)
+        lon = float(city["lon"]) + random.uniform(-SAMPLE_JITTER, SAMPLE_JITTER)
 
-        delta = 0.01
+        delta = SAMPLE_DELTA
         sample_box = box(lon - delta, lat - delta, lon + delta, lat + delta)
 
-        # Download road network
-        custom_filter = '["highway"~"motorway|trunk|primary|secondary|tertiary|residential|unclassified"]'
-
+        # Slice the sample out of the city-wide network
         try:
-            G = ox.graph_from_polygon(
-                sample_box,
-                network_type="all",
-                custom_filter=custom_filter,
-                simplify=True,
-            )
+            G = ox.truncate.truncate_graph_polygon(G_city, sample_box)
             G = G.to_undirected()
         except Exception as network_error:
-            print(
-                f"Network download error for {city['city']} sample {i}: {network_error}"
-            )
+            print(f"Network slice error for {city['city']} sample {i}: {network_error}")
             return None
 
         # print(f"Edges: {len(G.edges())}, Nodes: {len(G.nodes())}")
@@ -270,102 +433,74 @@ def process_city_sample(args):
         city_name = str(city["city"])
         sample_id = f"{city_name}_{i}"
 
+        # Project nodes once; both tiles share the sample box as their extent
+        node_px = project_nodes(G, sample_box.bounds, size)
+        # Minor roads first so higher-class roads (lower ids) end up on top
+        edges = sorted(
+            (
+                (u, v, data, get_road_type(data.get("highway", "unclassified")))
+                for u, v, data in G.edges(data=True)
+            ),
+            key=lambda e: e[3],
+            reverse=True,
+        )
+        road_widths_px = [line_width_px(w, size) for w in ROAD_WIDTHS]
+
         # 1) CONTROL IMAGE
-        fig, ax = plt.subplots(figsize=(8, 8))
-        ax.set_facecolor("white")
+        control = Image.new("RGB", (size, size), "white")
+        draw = ImageDraw.Draw(control)
         # print("Drawing control image...")
 
         # Safely draw road network
-        for u, v, data in G.edges(data=True):
+        for u, v, data, _ in edges:
             try:
                 color, linewidth, linestyle = get_control_line_style(data)
-                edge_coords = [
-                    (G.nodes[u]["x"], G.nodes[u]["y"]),  # (lon, lat)
-                    (G.nodes[v]["x"], G.nodes[v]["y"]),  # (lon, lat)
-                ]
-                ax.plot(
-                    *zip(*edge_coords),
-                    color=color,
-                    linewidth=linewidth,
-                    linestyle=linestyle,
-                    solid_capstyle="round",
+                draw_segment(
+                    draw,
+                    node_px[u],
+                    node_px[v],
+                    color,
+                    line_width_px(linewidth, size),
+                    linestyle,
                 )
             except Exception as edge_error:
                 print(f"Error drawing edge: {edge_error}")
 
-        ax.axis("off")
         control_path = Path(output_dir) / "control" / f"{sample_id}.png"
-        fig.savefig(control_path, bbox_inches="tight", pad_inches=0, dpi=size / 8)
-        plt.close(fig)
+        control.save(control_path)
         # print(f"Control image saved: {control_path}")
 
         # 2) TARGET IMAGE
-        fig, ax = plt.subplots(figsize=(8, 8))
-        ax.set_facecolor("white")
-        ax.set_aspect("equal", "box")
+        target = Image.new("RGB", (size, size), "white")
+        draw = ImageDraw.Draw(target)
 
-        # print("Fetching buildings...")
-        try:
-            buildings = ox.features.features_from_polygon(
-                sample_box, tags={"building": True}
-            )
-            # print(f"Buildings: {len(buildings)}")
-        except Exception as buildings_error:
-            print(f"Error fetching buildings: {buildings_error}")
-            buildings = None
+        # Pick this sample's buildings out of the city-wide set (blocks only
+        # if the background download hasn't finished yet)
+        buildings = None
+        buildings_city = buildings_future.result()
+        if buildings_city is not None and not buildings_city.empty:
+            hits = buildings_city.sindex.query(sample_box, predicate="intersects")
+            buildings = buildings_city.iloc[hits]
 
         # Plot building polygons
         if buildings is not None and not buildings.empty:
-            for _, row in buildings.iterrows():
-                try:
-                    # print("Plotting building...")
-                    geom = row.geometry
-                    if geom.geom_type in ["Polygon", "MultiPolygon"]:
-                        if geom.geom_type == "Polygon":
-                            xs, ys = geom.exterior.xy
-                            ax.fill(xs, ys, color="#CCCCCC", alpha=0.5, zorder=0)
-                        else:
-                            for subgeom in geom.geoms:
-                                xs, ys = subgeom.exterior.xy
-                                ax.fill(xs, ys, color="#CCCCCC", alpha=0.5, zorder=0)
-                except Exception as building_plot_error:
-                    print(f"Error plotting building: {building_plot_error}")
+            try:
+                rings = building_rings_px(buildings, sample_box.bounds, size)
+                for ring in rings:
+                    draw.polygon(ring, fill=BUILDING_FILL)
+            except Exception as building_plot_error:
+                print(f"Error plotting buildings: {building_plot_error}")
 
         # Draw roads with hierarchy styling
-        for u, v, data in G.edges(data=True):
-            # Safely extract road type
-            road_type = get_road_type(data.get("highway", "unclassified"))
-
-            # Get road style with fallback
-            style = RoadProperties.ROAD_HIERARCHY.get(
-                road_type, RoadProperties.ROAD_HIERARCHY["unclassified"]
-            )
-
-            edge_coords = [
-                (G.nodes[u]["x"], G.nodes[u]["y"]),  # (lon, lat)
-                (G.nodes[v]["x"], G.nodes[v]["y"]),  # (lon, lat)
-            ]
-            ax.plot(
-                *zip(*edge_coords),
-                color=style["color"],
-                linewidth=style["width"],
-                solid_capstyle="round",
-                zorder=1,
+        for u, v, _, road_id in edges:
+            draw_segment(
+                draw, node_px[u], node_px[v], ROAD_RGB[road_id], road_widths_px[road_id]
             )
 
-        ax.axis("off")
         target_path = Path(output_dir) / "target" / f"{sample_id}.png"
-        fig.savefig(target_path, bbox_inches="tight", pad_inches=0, dpi=size / 8)
-        plt.close(fig)
+        target.save(target_path)
         # print(f"Target image saved: {target_path}")
 
-        # 3) Resize & Save
-        for path in [control_path, target_path]:
-            with Image.open(path) as img:
-                img = img.convert("RGB")
-                img = img.resize((size, size), Image.Resampling.LANCZOS)
-                img.save(path, quality=95)
-
         # Return sample metadata
         return {
             "sample_id": sample_id,
@@ -387,31 +522,80 @@ def process_city_sample(args):
 ########################################
 # Main Collector Class
 ########################################
+def configure_osmnx():
+    """Apply the OSMnx settings used for data collection."""
+    ox.settings.log_console = False
+    ox.settings.timeout = 60  # Increased timeout
+    ox.settings.memory = True
+
+    # Cache Overpass responses in one SQLite file shared by every worker
+    # (WAL mode lets them read concurrently) instead of OSMnx's per-query JSON
+    # files. Overpass queries are POSTs; the slot-status endpoint must stay live.
+    ox.settings.use_cache = False
+    requests_cache.install_cache(
+        "osmnx_cache",
+        backend="sqlite",
+        use_cache_dir=True,
+        wal=True,
+        expire_after=timedelta(days=30),
+        allowable_methods=("GET", "POST"),
+        urls_expire_after={"*/status": requests_cache.DO_NOT_CACHE},
+    )
+
+
+def _worker_init():
+    """Runs once per spawned worker; spawned processes don't inherit settings."""
+    warnings.filterwarnings("ignore")
+    configure_osmnx()
+
+
+def iter_city_batches(args_list, num_processes: int):
+    """Yield each city's results, running in-process when a pool can't pay off"""
+    if num_processes == 1 or len(args_list) <= 1:
+        yield from map(process_city_batch, args_list)
+        return
+
+    # Spawned workers start clean instead of forking the parent's
+    # OSMnx/GeoPandas state.
+    with ProcessPoolExecutor(
+        max_workers=num_processes,
+        mp_context=get_context("spawn"),
+        initializer=_worker_init,
+    ) as executor:
+        futures = [executor.submit(process_city_batch, a) for a in args_list]
+        for future in as_completed(futures):
+            yield future.result()
+
+
 class RoadNetworkDataCollector:
     def __init__(self, output_dir: str, size: int = 512):
         self.output_dir = Path(output_dir)
         self.size = size
         self.setup_directories()
 
-        # Configure OSMnx
-        ox.settings.log_console = False
-        ox.settings.use_cache = True
-        ox.settings.timeout = 60  # Increased timeout
-        ox.settings.memory = True
+        configure_osmnx()
 
     def setup_directories(self):
         for dir_name in ["control", "target", "metadata"]:
             (self.output_dir / dir_name).mkdir(parents=True, exist_ok=True)
 
     def collect_from_cities(self, cities_file: str, samples_per_city: int = 10):
-        cities = pd.read_csv(cities_file)
+        if Path(cities_file).suffix == ".parquet":
+            cities = pd.read_parquet(cities_file, columns=["city", "lat", "lon"])
+        else:
+            cities = pd.read_csv(
+                cities_file, usecols=["city", "lat", "lon"], engine="pyarrow"
+            )
         total_samples = len(cities) * samples_per_city
         print(f"Starting collection of {total_samples} samples...")
 
-        args_list = []
-        for _, city in cities.iterrows():
-            for i in range(samples_per_city):
-                args_list.append((city, i, str(self.output_dir), self.size))
+        # One task per city so its OSM data is downloaded once for all samples.
+        # Plain dicts pickle far smaller than pandas rows.
+        sample_ids = list(range(samples_per_city))
+        args_list = [
+            (city, sample_ids, str(self.output_dir), self.size)
+            for city in cities.to_dict("records")
+        ]
 
         metadata = []
         start_time = time.time()
@@ -419,13 +603,10 @@ class RoadNetworkDataCollector:
 
         # Use (CPU cores - 1) to avoid overload
         num_processes = max(1, multiprocessing.cpu_count() - 1)
-        with Pool(processes=num_processes) as pool:
-            for result in tqdm(
-                pool.imap_unordered(process_city_sample, args_list),
-                total=len(args_list),
-            ):
-                if result:
-                    metadata.append(result)
+        with tqdm(total=total_samples) as pbar:
+            for results in iter_city_batches(args_list, num_processes):
+                pbar.update(len(results))
+                metadata.extend(result for result in results if result)
 
 
 if __name__ == "__main__":
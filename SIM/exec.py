@@ -2,7 +2,8 @@
 import cv2
 import numpy as np
 from skimage.morphology import skeletonize
-from skimage.graph import route_through_array
+from skimage.graph import MCP_Geometric
+from scipy.ndimage import convolve
 
 
 class RoadNetworkCleaner:
@@ -31,72 +32,44 @@ class RoadNetworkCleaner:
         return cleaned_network
 
     def find_network_points(self, skeleton):
-        endpoints = []
-        intersections = []
+        skel = skeleton.astype(np.uint8)
+        neighbors = convolve(skel, np.ones((3, 3), np.uint8), mode="constant") - skel
 
-        padded = np.pad(skeleton, pad_width=1, mode="constant", constant_values=0)
+        # argwhere yields (y, x); callers expect (x, y)
+        endpoints = np.argwhere(skel & (neighbors == 1))[:, ::-1]
+        intersections = np.argwhere(skel & (neighbors > 2))[:, ::-1]
 
-        # Use width and height from original image
-        for y in range(1, self.height + 1):
-            for x in range(1, self.width + 1):
-                if padded[y, x]:
-                    neighbors = padded[y - 1 : y + 2, x - 1 : x + 2].sum() - 1
-
-                    if neighbors == 1:
-                        endpoints.append((x - 1, y - 1))
-                    elif neighbors > 2:
-                        intersections.append((x - 1, y - 1))
-
-        return endpoints, intersections
+        return (
+            [tuple(p) for p in endpoints.tolist()],
+            [tuple(p) for p in intersections.tolist()],
+        )
 
     def remove_spurious_roads(self, skeleton, endpoints, intersections):
         cleaned = skeleton.copy()
-
-        for endpoint in endpoints:
-            # Find closest intersection
-            closest_dist = float("inf")
-            closest_int = None
-
-            for intersection in intersections:
-                dist = np.sqrt(
-                    (endpoint[0] - intersection[0]) ** 2
-                    + (endpoint[1] - intersection[1]) ** 2
-                )
-                if dist < closest_dist:
-                    closest_dist = dist
-                    closest_int = intersection
-
-            if closest_dist < self.min_road_length and closest_int is not None:
-                try:
-                    path = self.get_path(skeleton, endpoint, closest_int)
-                    for py, px in path:  # Note: route_through_array returns (y,x)
-                        if (
-                            0 <= py < self.height and 0 <= px < self.width
-                        ):  # Bounds check
-                            cleaned[py, px] = False
-                except Exception as e:
-                    print(
-                        f"Warning: Could not process path for endpoint {endpoint}: {e}"
-                    )
+        if not endpoints or not intersections:
+            return cleaned
+
+        # Unit cost along the skeleton and prohibitive off it, so the cost
+        # reaching an endpoint is its road length to the nearest intersection
+        cost_array = (~skeleton).astype(np.float32) * 1e6 + 1
+
+        # One multi-source wave from every intersection, capped at the length
+        # of road we would remove anyway
+        mcp = MCP_Geometric(cost_array, fully_connected=True)
+        costs, _ = mcp.find_costs(
+            starts=[(y, x) for x, y in intersections],  # MCP uses (y,x)
+            ends=[(y, x) for x, y in endpoints],
+            max_cumulative_cost=self.min_road_length,
+        )
+
+        for x, y in endpoints:
+            if costs[y, x] < self.min_road_length:
+                # Skip the seed so the junction itself stays on the network
+                for py, px in mcp.traceback((y, x))[1:]:
+                    cleaned[py, px] = False
 
         return cleaned
 
-    def get_path(self, skeleton, start, end):
-        # Create cost array
-        cost_array = ~skeleton
-
-        try:
-            indices, _ = route_through_array(
-                cost_array,
-                start=(start[1], start[0]),  # Convert to (y,x)
-                end=(end[1], end[0]),
-                fully_connected=True,
-            )
-            return indices
-        except Exception as e:
-            print(f"Warning: Path finding failed: {e}")
-            return []
-
 
 def visualize_cleanup(original, cleaned):
     # Convert to 3 channel images
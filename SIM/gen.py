@@ -1,19 +1,35 @@
 import torch
 from PIL import Image
 from diffusers import StableDiffusionControlNetImg2ImgPipeline, ControlNetModel
+from diffusers import DPMSolverMultistepScheduler
 
-device = "cuda"
+device = (
+    "cuda"
+    if torch.cuda.is_available()
+    else "mps" if torch.backends.mps.is_available() else "cpu"
+)
+# float16 on GPUs (CUDA and Apple Silicon); CPU kernels need float32
+dtype = torch.float32 if device == "cpu" else torch.float16
 
-# 1) Load the ControlNet for MLSD (roads, lines, etc.) in float16
+# 1) Load the ControlNet for MLSD (roads, lines, etc.)
 controlnet = ControlNetModel.from_pretrained(
-    "lllyasviel/sd-controlnet-mlsd", torch_dtype=torch.float16
+    "lllyasviel/sd-controlnet-mlsd", torch_dtype=dtype
 ).to(device)
 
 # 2) Load the corresponding Img2Img ControlNet pipeline
 pipe = StableDiffusionControlNetImg2ImgPipeline.from_pretrained(
-    "runwayml/stable-diffusion-v1-5", controlnet=controlnet, torch_dtype=torch.float16
+    "runwayml/stable-diffusion-v1-5", controlnet=controlnet, torch_dtype=dtype
 ).to(device)
 
+# Faster sampling: DPM-Solver++ converges in ~30 steps and the VAE decodes one
+# image at a time
+pipe.scheduler = DPMSolverMultistepScheduler.from_config(pipe.scheduler.config)
+pipe.enable_vae_slicing()
+if device == "cuda":
+    # xFormers and CUDA graphs are CUDA-only; MPS/CPU use PyTorch SDPA attention
+    pipe.enable_xformers_memory_efficient_attention()
+    pipe.unet = torch.compile(pipe.unet, mode="reduce-overhead")
+
 # 3) Prepare your images
 #    (a) The init image (rough sketch or actual photo you want to transform)
 init_image = (
@@ -35,8 +51,9 @@ result = pipe(
     image=init_image,  # The init image
     control_image=control_image,  # The line-based or map-based guidance
     strength=0.7,  # How strongly to transform the init image
-    num_inference_steps=600,
+    num_inference_steps=30,
     guidance_scale=12,
+    generator=torch.Generator(device).manual_seed(0),  # Comparable runs
 )
 
 # 5) Save or view the result
@@ -13,8 +13,13 @@ class RoadNetworkInference:
             if torch.cuda.is_available()
             else "mps" if torch.backends.mps.is_available() else "cpu"
         )
-        self.model = torch.load(model_path, map_location=self.device)
-        self.model.eval()
+        self.model = torch.load(model_path, map_location=self.device).eval()
+        if self.device.type == "cuda":
+            # FP16 weights halve memory traffic; CUDA graphs cut launch overhead
+            self.model = self.model.half()
+            self.model = torch.compile(
+                self.model, mode="reduce-overhead", fullgraph=False
+            )
 
         self.transform = T.Compose(
             [T.Resize((256, 256)), T.ToTensor(), T.Normalize(mean=[0.5], std=[0.5])]
@@ -28,9 +33,13 @@ class RoadNetworkInference:
 
     def generate_road_network(self, sketch_tensor: torch.Tensor) -> torch.Tensor:
         """Generate road network from sketch tensor"""
-        with torch.no_grad():
+        if self.device.type == "cuda":
+            sketch_tensor = sketch_tensor.half()
+        with torch.inference_mode():
             output = self.model(sketch_tensor)
-        return output
+        # CUDA graphs reuse their output buffer on the next call, so hand the
+        # caller its own copy
+        return output.clone()
 
     def postprocess_output(self, output_tensor: torch.Tensor) -> Dict[str, List[Dict]]:
         """Convert model output to road network structure"""
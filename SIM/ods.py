@@ -1,9 +1,13 @@
 import osmnx as ox
 import networkx as nx
+import matplotlib
+
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
 import pandas as pd
 from pathlib import Path
-from shapely.geometry import box, Point, LineString
+from shapely.geometry import box
 import random
 from PIL import Image
 from tqdm import tqdm
@@ -11,12 +15,24 @@ import warnings
 import time
 import multiprocessing
 from multiprocessing import Pool
+from contextlib import nullcontext
 import os
+import pickle
+from functools import lru_cache
 import numpy as np
 from typing import Dict, List, Tuple
+from collections import defaultdict
 
 warnings.filterwarnings("ignore")
 
+CUSTOM_FILTER = (
+    '["highway"~"motorway|trunk|primary|'
+    'secondary|tertiary|residential|unclassified"]'
+)
+# Radius of the per-city download; covers the 0.009 deg jitter plus the
+# 0.0045 deg half-width of every sample box
+CITY_GRAPH_DIST = 2000
+
 
 class RoadProperties:
     ROAD_HIERARCHY = {
@@ -36,26 +52,67 @@ class RoadProperties:
     }
 
 
+def get_node_arrays(G: nx.Graph) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Node ids and their lon/lat as arrays, cached on the graph"""
+    if "_node_arrays" not in G.graph:
+        n = G.number_of_nodes()
+        nodes = np.fromiter(G.nodes(), dtype=np.int64, count=n)
+        xs = np.fromiter((G.nodes[v]["x"] for v in nodes), dtype=np.float64, count=n)
+        ys = np.fromiter((G.nodes[v]["y"] for v in nodes), dtype=np.float64, count=n)
+        G.graph["_node_arrays"] = (nodes, xs, ys)
+    return G.graph["_node_arrays"]
+
+
 def get_border_nodes(G: nx.Graph) -> List[int]:
-    """Identify nodes that lie on the border of the graph"""
+    """Identify nodes that lie on the border of the graph (memoized on G.graph)"""
+    if "_border_nodes" in G.graph:
+        return G.graph["_border_nodes"]
+
     bbox = ox.utils_geo.bbox_from_point(
         (G.graph["center_lat"], G.graph["center_lng"]), dist=G.graph["dist"]
     )
-    border_nodes = []
-
-    for node, data in G.nodes(data=True):
-        lat, lon = data["y"], data["x"]
-        # Check if node is within small distance of boundary
-        margin = 0.0001  # Adjust based on your scale
-        if (
-            abs(lat - bbox[0]) < margin
-            or abs(lat - bbox[1]) < margin
-            or abs(lon - bbox[2]) < margin
-            or abs(lon - bbox[3]) < margin
+    nodes, lons, lats = get_node_arrays(G)
+
+    # Check if node is within small distance of boundary
+    margin = 0.0001  # Adjust based on your scale
+    mask = (
+        (np.abs(lats - bbox[0]) < margin)
+        | (np.abs(lats - bbox[1]) < margin)
+        | (np.abs(lons - bbox[2]) < margin)
+        | (np.abs(lons - bbox[3]) < margin)
+    )
+
+    G.graph["_border_nodes"] = nodes[mask].tolist()
+    return G.graph["_border_nodes"]
+
+
+def precompute_graph_features(G: nx.Graph):
+    """Border nodes, road segments bucketed by type and the edge count in one
+    pass over the graph, cached on G.graph for validation, rendering and metadata"""
+    if "_edge_buckets" in G.graph:
+        return
+
+    get_border_nodes(G)
+
+    # (lat, lon) per node from the cached arrays instead of G.nodes[...] hits
+    nodes, lons, lats = get_node_arrays(G)
+    coords = dict(zip(nodes.tolist(), zip(lats.tolist(), lons.tolist())))
+
+    buckets = defaultdict(list)
+    edge_count = 0
+    for u, v, data in G.edges(data=True):
+        road_type = data.get("highway", "unclassified")
+        # OSM may give a list of types; those fall back like unknown types
+        if not (
+            isinstance(road_type, str) and road_type in RoadProperties.ROAD_HIERARCHY
         ):
-            border_nodes.append(node)
+            road_type = "unclassified"
 
-    return border_nodes
+        buckets[road_type].append([coords[u], coords[v]])
+        edge_count += 1
+
+    G.graph["_edge_buckets"] = dict(buckets)
+    G.graph["_edge_count"] = edge_count
 
 
 def validate_network_connectivity(G: nx.Graph) -> bool:
@@ -65,65 +122,103 @@ def validate_network_connectivity(G: nx.Graph) -> bool:
     if len(border_nodes) < 2:
         return False
 
-    # Check if graph is connected
-    if not nx.is_connected(G):
-        return False
-
-    # Check connectivity between border points
-    for i, start in enumerate(border_nodes[:-1]):
-        path_exists = False
-        for end in border_nodes[i + 1 :]:
-            if nx.has_path(G, start, end):
-                path_exists = True
-                break
-        if not path_exists:
-            return False
-
-    return True
+    # A connected graph already has a path between every pair of border
+    # points, so no per-pair search is needed
+    return nx.is_connected(G)
 
 
 def generate_properties(G: nx.Graph) -> List[Dict]:
     """Generate properties along the road network"""
-    properties = []
-    edges = list(G.edges(data=True))
+    edges = list(G.edges())
 
     # Determine number of properties based on network size
     num_properties = max(5, len(edges) // 3)
-
-    for _ in range(num_properties):
-        # Select random edge
-        edge = random.choice(edges)
-
-        # Get point along edge
-        start = Point(G.nodes[edge[0]]["x"], G.nodes[edge[0]]["y"])
-        end = Point(G.nodes[edge[1]]["x"], G.nodes[edge[1]]["y"])
-        line = LineString([start, end])
-
-        # Random point along edge
-        distance = random.random()
-        point = line.interpolate(distance, normalized=True)
-
-        # Determine property type
-        prop_type = random.choices(
-            list(RoadProperties.PROPERTY_TYPES.keys()),
-            weights=[p["weight"] for p in RoadProperties.PROPERTY_TYPES.values()],
-        )[0]
-
-        properties.append(
-            {
-                "type": prop_type,
-                "position": (point.x, point.y),
-                "size": random.randint(1, 5),
-                "edge": edge[:2],
-            }
+    rng = np.random.default_rng()
+
+    # Edge endpoints as (x_u, y_u, x_v, y_v); a straight lerp replaces the
+    # Shapely LineString.interpolate round trip
+    edges_arr = np.array(
+        [
+            (G.nodes[u]["x"], G.nodes[u]["y"], G.nodes[v]["x"], G.nodes[v]["y"])
+            for u, v in edges
+        ]
+    )
+    idx = rng.integers(0, len(edges), num_properties)
+    t = rng.random(num_properties)
+    pts = edges_arr[idx, :2] + t[:, None] * (edges_arr[idx, 2:] - edges_arr[idx, :2])
+
+    # Determine property types and sizes
+    type_names = list(RoadProperties.PROPERTY_TYPES.keys())
+    weights = np.array([p["weight"] for p in RoadProperties.PROPERTY_TYPES.values()])
+    types = rng.choice(len(type_names), num_properties, p=weights / weights.sum())
+    sizes = rng.integers(1, 6, num_properties)
+
+    return [
+        {
+            "type": type_names[type_id],
+            "position": tuple(pt),
+            "size": size,
+            "edge": edges[edge_id],
+        }
+        for type_id, pt, size, edge_id in zip(
+            types.tolist(), pts.tolist(), sizes.tolist(), idx.tolist()
         )
+    ]
+
+
+# One figure per worker process, reused across samples
+_FIG = None
+_AX = None
+
+
+def get_reusable_axes():
+    """Return this process's shared figure/axes, cleared for a new image"""
+    global _FIG, _AX
+    if _FIG is None:
+        _FIG, _AX = plt.subplots(figsize=(8, 8))
+        # Axes fill the whole canvas so the saved PNG is exactly the figure size
+        _FIG.subplots_adjust(left=0, right=1, bottom=0, top=1)
+    _AX.clear()
+    return _FIG, _AX
+
+
+def save_figure_rgb(fig, path, size: int):
+    """Render the figure straight to an RGB size x size PNG, no savefig pass"""
+    # 8in at size/8 dpi is exact in floating point, so Agg's int() truncation
+    # of the canvas size always lands on `size`
+    fig.set_size_inches(8, 8)
+    fig.set_dpi(size / 8)
+    fig.canvas.draw()
+    rgba = np.asarray(fig.canvas.buffer_rgba())
+    Image.fromarray(rgba).convert("RGB").save(path)
+
+
+def download_city_graph(city, graph_dir: Path) -> Path:
+    """Download one road network around the city and pickle it for the workers"""
+    graph_path = graph_dir / f"{city['lat']:.5f}_{city['lon']:.5f}.pkl"
+    if not graph_path.exists():
+        G_city = ox.graph_from_point(
+            (city["lat"], city["lon"]),
+            dist=CITY_GRAPH_DIST,
+            network_type="drive",
+            custom_filter=CUSTOM_FILTER,
+            simplify=True,
+        )
+        with open(graph_path, "wb") as f:
+            pickle.dump(G_city, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return graph_path
+
 
-    return properties
+@lru_cache(maxsize=2)
+def load_city_graph(graph_path: str) -> nx.MultiDiGraph:
+    """Unpickle a city graph, kept in memory while the worker stays on that city"""
+    with open(graph_path, "rb") as f:
+        return pickle.load(f)
 
 
 def process_city_sample(args):
     """Process a single sample for a city with enhanced validation and properties"""
-    city, i, output_dir, size = args
+    city, i, output_dir, size, graph_path = args
     try:
         plt.ioff()
 
@@ -135,17 +230,11 @@ def process_city_sample(args):
         delta = 0.0045
         sample_box = box(lon - delta, lat - delta, lon + delta, lat + delta)
 
-        # Get road network with custom filter
-        custom_filter = (
-            '["highway"~"motorway|trunk|primary|'
-            'secondary|tertiary|residential|unclassified"]'
-        )
-        G = ox.graph_from_polygon(
-            sample_box,
-            network_type="drive",
-            custom_filter=custom_filter,
-            simplify=True,
-        )
+        # Slice the road network out of the pre-downloaded city graph; the
+        # truncated copy is a new graph, so nothing is cached on G_city
+        G_city = load_city_graph(graph_path)
+        G = ox.truncate.truncate_graph_polygon(G_city, sample_box)
+        precompute_graph_features(G)
 
         # Validate network
         if not validate_network_connectivity(G):
@@ -158,7 +247,7 @@ def process_city_sample(args):
         sample_id = f"{city_name}_{i}"
 
         # Create and save control image (sketch)
-        fig, ax = plt.subplots(figsize=(8, 8))
+        fig, ax = get_reusable_axes()
         ox.plot_graph(
             G,
             ax=ax,
@@ -171,63 +260,48 @@ def process_city_sample(args):
         ax.axis("off")
 
         control_path = Path(output_dir) / "control" / f"{sample_id}.png"
-        fig.savefig(control_path, bbox_inches="tight", pad_inches=0, dpi=size / 8)
-        plt.close(fig)
+        save_figure_rgb(fig, control_path, size)
 
         # Create target image with road hierarchy and properties
-        fig, ax = plt.subplots(figsize=(8, 8))
-
-        # Draw roads with hierarchy
-        for u, v, data in G.edges(data=True):
-            road_type = data.get("highway", "unclassified")
-            style = RoadProperties.ROAD_HIERARCHY.get(
-                road_type, RoadProperties.ROAD_HIERARCHY["unclassified"]
-            )
-
-            edge_coords = [
-                (G.nodes[u]["y"], G.nodes[u]["x"]),
-                (G.nodes[v]["y"], G.nodes[v]["x"]),
-            ]
-
-            ax.plot(
-                *zip(*edge_coords),
-                color=style["color"],
-                linewidth=style["width"],
-                solid_capstyle="round",
-                zorder=1,
-            )
-
-        # Draw properties
-        for prop in properties:
-            ax.scatter(
-                prop["position"][1],
-                prop["position"][0],
-                c=RoadProperties.PROPERTY_TYPES[prop["type"]]["color"],
-                s=30 * prop["size"],
-                zorder=2,
+        fig, ax = get_reusable_axes()
+
+        # Draw roads with hierarchy, one LineCollection per road type
+        for road_type, segments in G.graph["_edge_buckets"].items():
+            style = RoadProperties.ROAD_HIERARCHY[road_type]
+            ax.add_collection(
+                LineCollection(
+                    segments,
+                    colors=style["color"],
+                    linewidths=style["width"],
+                    capstyle="round",
+                    zorder=1,
+                )
             )
+        ax.autoscale_view()
+
+        # Draw properties in a single scatter call
+        positions = np.array([prop["position"] for prop in properties])
+        ax.scatter(
+            positions[:, 1],
+            positions[:, 0],
+            c=[RoadProperties.PROPERTY_TYPES[p["type"]]["color"] for p in properties],
+            s=30 * np.array([prop["size"] for prop in properties]),
+            zorder=2,
+        )
 
         ax.axis("off")
 
         target_path = Path(output_dir) / "target" / f"{sample_id}.png"
-        fig.savefig(target_path, bbox_inches="tight", pad_inches=0, dpi=size / 8)
-        plt.close(fig)
-
-        # Process images
-        for path in [control_path, target_path]:
-            with Image.open(path) as img:
-                img = img.convert("RGB")
-                img = img.resize((size, size), Image.Resampling.LANCZOS)
-                img.save(path, quality=95)
+        save_figure_rgb(fig, target_path, size)
 
         return {
             "sample_id": sample_id,
             "city": city_name,
             "latitude": lat,
             "longitude": lon,
-            "road_count": len(G.edges()),
+            "road_count": G.graph["_edge_count"],
             "node_count": len(G.nodes()),
-            "border_nodes": len(get_border_nodes(G)),
+            "border_nodes": len(G.graph["_border_nodes"]),
             "properties": len(properties),
         }
 
@@ -253,15 +327,28 @@ class RoadNetworkDataCollector:
             (self.output_dir / dir_name).mkdir(parents=True, exist_ok=True)
 
     def collect_from_cities(self, cities_file: str, samples_per_city: int = 10):
-        cities = pd.read_csv(cities_file)
+        cities = pd.read_csv(cities_file, usecols=["city", "lat", "lon"])
         total_samples = len(cities) * samples_per_city
         print(f"Starting collection of {total_samples} samples...")
 
-        # Prepare arguments for multiprocessing
+        # Download each city's network once up front; workers only get the
+        # pickle path and slice their samples from it without any HTTP calls
+        graph_dir = self.output_dir / "graphs"
+        graph_dir.mkdir(parents=True, exist_ok=True)
+
+        # Prepare arguments for multiprocessing; plain dicts pickle far
+        # smaller than pandas rows
         args_list = []
-        for _, city in cities.iterrows():
+        for city in tqdm(cities.to_dict("records"), desc="Cities"):
+            try:
+                graph_path = str(download_city_graph(city, graph_dir))
+            except Exception as e:
+                print(f"Error downloading {city['city']}: {str(e)}")
+                continue
             for i in range(samples_per_city):
-                args_list.append((city, i, str(self.output_dir), self.size))
+                args_list.append(
+                    (city, i, str(self.output_dir), self.size, graph_path)
+                )
 
         # Process samples using multiprocessing
         metadata = []
@@ -271,11 +358,21 @@ class RoadNetworkDataCollector:
         # Use number of CPU cores minus 1 to avoid overloading
         num_processes = max(1, multiprocessing.cpu_count() - 1)
 
-        with Pool(processes=num_processes) as pool:
-            for result in tqdm(
-                pool.imap_unordered(process_city_sample, args_list),
-                total=len(args_list),
-            ):
+        # A single worker or a single task gains nothing from a pool, so run
+        # those inline and skip the spin-up and pickling
+        use_pool = num_processes > 1 and len(args_list) > 1
+        with Pool(processes=num_processes) if use_pool else nullcontext() as pool:
+            results = (
+                pool.imap_unordered(
+                    process_city_sample,
+                    args_list,
+                    # Batch tasks per IPC round trip, still ~8 chunks per worker
+                    chunksize=max(1, len(args_list) // (num_processes * 8)),
+                )
+                if pool
+                else map(process_city_sample, args_list)
+            )
+            for result in tqdm(results, total=len(args_list)):
                 if result:
                     metadata.append(result)
                     completed += 1
@@ -7,10 +7,7 @@ from torch.utils.data import DataLoader
 from torchvision import transforms
 from diffusers import StableDiffusionControlNetPipeline, ControlNetModel
 import safetensors.torch
-from skimage.metrics import (
-    structural_similarity as ssim,
-    peak_signal_noise_ratio as psnr,
-)
+from torchmetrics.functional import structural_similarity_index_measure
 
 import torch.nn.functional as F
 
@@ -79,20 +76,15 @@ class RoadNetworkEvaluator:
         )
         self.controlnet.to(self.device).eval()
 
-    @torch.no_grad()
+    @torch.inference_mode()
     def evaluate_batch(self, val_loader):
-        total_metrics = []
+        total_metrics = {}
 
         for batch_idx, batch in enumerate(val_loader):
             print(f"\rEvaluating batch {batch_idx+1}/{len(val_loader)}", end="")
 
-            control = batch["control"].to(self.device)
-            target = batch["target"].to(self.device)
-
-            # If using CUDA (which uses float16 for the model), convert inputs to half precision:
-            if self.device.type == "cuda":
-                control = control.half()
-                target = target.half()  # Cast target as needed
+            control = batch["control"].to(self.device, non_blocking=True)
+            target = batch["target"].to(self.device, non_blocking=True)
 
             # Forward pass through ControlNet
             try:
@@ -108,14 +100,20 @@ class RoadNetworkEvaluator:
                 # Create a control condition tensor (your example random noise).
                 controlnet_cond = torch.randn_like(control)
 
-                output = self.controlnet(
-                    control,  # sample
-                    timesteps,  # timestep
-                    None,  # encoder_hidden_states
-                    controlnet_cond,  # controlnet_cond
-                    1.0,  # conditioning_scale
-                    False,  # return_dict
-                )
+                # Autocast handles the fp16 casts the CUDA model needs
+                with torch.autocast(
+                    device_type=self.device.type,
+                    dtype=torch.float16,
+                    enabled=self.device.type == "cuda",
+                ):
+                    output = self.controlnet(
+                        control,  # sample
+                        timesteps,  # timestep
+                        None,  # encoder_hidden_states
+                        controlnet_cond,  # controlnet_cond
+                        1.0,  # conditioning_scale
+                        False,  # return_dict
+                    )
                 # Get feature maps
                 if isinstance(output, tuple):
                     down_block_res_samples, mid_block_res_sample = output
@@ -132,10 +130,10 @@ class RoadNetworkEvaluator:
                 if generated.shape != target.shape:
                     generated = F.interpolate(generated, size=target.shape[2:])
 
-                # Compute metrics for each image in batch
-                for i in range(len(control)):
-                    metrics = self.compute_metrics(generated[i], target[i])
-                    total_metrics.append(metrics)
+                # Compute metrics for the whole batch at once
+                metrics = self.compute_metrics(generated, target)
+                for key, values in metrics.items():
+                    total_metrics.setdefault(key, []).extend(values)
 
             except Exception as e:
                 print(f"\nError processing batch {batch_idx}: {e}")
@@ -143,24 +141,26 @@ class RoadNetworkEvaluator:
 
         # Compute average metrics
         avg_metrics = {}
-        for key in total_metrics[0].keys():
-            avg_metrics[key] = np.mean([m[key] for m in total_metrics])
+        for key, values in total_metrics.items():
+            avg_metrics[key] = np.mean(values)
 
         return avg_metrics
 
     def compute_metrics(self, generated: torch.Tensor, target: torch.Tensor):
-        """Compute multiple evaluation metrics"""
-        generated = generated.cpu().numpy()
-        target = target.cpu().numpy()
-
-        metrics = {
-            "ssim": ssim(generated, target, data_range=1.0),
-            "psnr": psnr(target, generated, data_range=1.0),
-            "mse": np.mean((generated - target) ** 2),
-            "mae": np.mean(np.abs(generated - target)),
-        }
+        """Compute per-image evaluation metrics for a batch on the device"""
+        generated = generated.float()
+        target = target.float()
+
+        mse = F.mse_loss(generated, target, reduction="none").mean(dim=[1, 2, 3])
+        mae = (generated - target).abs().mean(dim=[1, 2, 3])
+        psnr = 10 * torch.log10(1.0 / mse)
+        ssim = structural_similarity_index_measure(
+            generated, target, data_range=1.0, reduction="none"
+        )
 
-        return metrics
+        # A single device-to-host copy (and sync) per batch
+        values = torch.stack([ssim, psnr, mse, mae]).cpu().tolist()
+        return dict(zip(["ssim", "psnr", "mse", "mae"], values))
 
 
 def main():
@@ -168,7 +168,16 @@ def main():
 
     # Create dataset and loader
     dataset = TestDataset(ModelPaths.VAL_CONTROL, ModelPaths.VAL_TARGET)
-    val_loader = DataLoader(dataset, batch_size=4, shuffle=False)
+    # Workers decode/transform the next batches while the GPU runs ControlNet;
+    # pinned pages let the non_blocking copies in evaluate_batch overlap
+    val_loader = DataLoader(
+        dataset,
+        batch_size=8,
+        shuffle=False,
+        num_workers=max(1, (os.cpu_count() or 2) // 2),
+        pin_memory=torch.cuda.is_available(),
+        persistent_workers=True,
+    )
 
     # Create evaluator
     evaluator = RoadNetworkEvaluator(
@@ -1,7 +1,6 @@
 import cv2
 import numpy as np
-from skimage.morphology import skeletonize
-from skimage.graph import route_through_array
+from skimage.graph import MCP_Geometric
 
 
 class RoadNetworkCleaner:
@@ -24,8 +23,11 @@ class RoadNetworkCleaner:
         _, binary = cv2.threshold(sketch_img, 127, 255, cv2.THRESH_BINARY)
         print("Binary conversion complete")
 
-        # Get skeleton
-        skeleton = skeletonize(binary > 0)
+        # Get skeleton (Zhang-Suen thinning from opencv-contrib)
+        skeleton = (
+            cv2.ximgproc.thinning(binary, thinningType=cv2.ximgproc.THINNING_ZHANGSUEN)
+            > 0
+        )
         print("Skeletonization complete")
 
         # Find network points
@@ -38,18 +40,66 @@ class RoadNetworkCleaner:
         cleaned_network = self.remove_spurious_roads(skeleton, endpoints, intersections)
         print("Spurious road removal complete")
 
-        return cleaned_network
+        # Pruning changes the topology (junctions turn into plain road, new
+        # endpoints appear), so detect once more on the cleaned network and
+        # hand those points to the caller
+        endpoints, intersections = self.find_network_points(cleaned_network)
+
+        return cleaned_network, endpoints, intersections
+
+    def find_network_points(self, skeleton):
+        skel = skeleton.astype(np.uint8)
+        # Zero padding so pixels outside the image never count as neighbors
+        neighbors = (
+            cv2.filter2D(
+                skel, -1, np.ones((3, 3), np.uint8), borderType=cv2.BORDER_CONSTANT
+            )
+            - skel
+        )
+
+        # argwhere yields (y, x); cv2 drawing expects (x, y)
+        endpoints = np.argwhere(skel & (neighbors == 1))[:, ::-1]
+        intersections = np.argwhere(skel & (neighbors >= 3))[:, ::-1]
+
+        return (
+            [tuple(p) for p in endpoints.tolist()],
+            [tuple(p) for p in intersections.tolist()],
+        )
+
+    def remove_spurious_roads(self, skeleton, endpoints, intersections):
+        cleaned = skeleton.copy()
+        if not endpoints or not intersections:
+            return cleaned
+
+        # Unit cost along the skeleton and prohibitive off it, so the cost
+        # reaching an endpoint is its road length to the nearest intersection
+        cost_array = (~skeleton).astype(np.float32) * 1e6 + 1
+
+        # One multi-source wave from every intersection, capped at the length
+        # of road we would remove anyway
+        mcp = MCP_Geometric(cost_array, fully_connected=True)
+        costs, _ = mcp.find_costs(
+            starts=[(y, x) for x, y in intersections],  # MCP uses (y,x)
+            ends=[(y, x) for x, y in endpoints],
+            max_cumulative_cost=self.min_road_length,
+        )
+
+        for x, y in endpoints:
+            if costs[y, x] < self.min_road_length:
+                # Skip the seed so the junction itself stays on the network
+                for py, px in mcp.traceback((y, x))[1:]:
+                    cleaned[py, px] = False
 
+        return cleaned
 
-def visualize_cleanup(original, cleaned):
+
+def visualize_cleanup(original, cleaned, endpoints, intersections):
     """Helper to visualize the cleaning process"""
     # Convert to RGB
     orig_rgb = cv2.cvtColor(original, cv2.COLOR_GRAY2RGB)
     clean_rgb = cv2.cvtColor((cleaned * 255).astype(np.uint8), cv2.COLOR_GRAY2RGB)
 
     # Draw endpoints and intersections on cleaned
-    endpoints, intersections = RoadNetworkCleaner().find_network_points(cleaned)
-
     for point in endpoints:
         cv2.circle(clean_rgb, point, 3, (255, 0, 0), -1)  # Red for endpoints
 
@@ -71,10 +121,10 @@ def process_road_sketch(input_path, output_path):
 
     # Process
     cleaner = RoadNetworkCleaner()
-    cleaned_network = cleaner.process_sketch(sketch)
+    cleaned_network, endpoints, intersections = cleaner.process_sketch(sketch)
 
     # Save result
-    comparison = visualize_cleanup(sketch, cleaned_network)
+    comparison = visualize_cleanup(sketch, cleaned_network, endpoints, intersections)
     cv2.imwrite(output_path, comparison)
     print(f"Saved output to: {output_path}")
 
@@ -1,10 +1,22 @@
 import os
 import random
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from sklearn.model_selection import train_test_split
 
 
+def link_or_copy(src: Path, dst: Path):
+    """Hardlink src to dst, falling back to a plain data copy across filesystems"""
+    # Re-runs replace what an earlier split left behind
+    if dst.exists():
+        dst.unlink()
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
 def split_dataset(dataset_path: str, val_split: float = 0.1):
     """Split dataset into training and validation sets"""
     dataset_path = Path(dataset_path)
@@ -23,18 +35,19 @@ def split_dataset(dataset_path: str, val_split: float = 0.1):
         sample_ids, test_size=val_split, random_state=42
     )
 
-    # Move files to respective directories
-    for sample_id in train_ids:
-        for dir_type in ["control", "target"]:
-            src = dataset_path / dir_type / f"{sample_id}.png"
-            dst = dataset_path / "train" / dir_type / f"{sample_id}.png"
-            shutil.copy2(src, dst)
-
-    for sample_id in val_ids:
-        for dir_type in ["control", "target"]:
-            src = dataset_path / dir_type / f"{sample_id}.png"
-            dst = dataset_path / "val" / dir_type / f"{sample_id}.png"
-            shutil.copy2(src, dst)
+    # Link files into respective directories
+    jobs = [
+        (
+            dataset_path / dir_type / f"{sample_id}.png",
+            dataset_path / split / dir_type / f"{sample_id}.png",
+        )
+        for split, ids in [("train", train_ids), ("val", val_ids)]
+        for sample_id in ids
+        for dir_type in ["control", "target"]
+    ]
+    # I/O bound, so threads overlap the filesystem calls
+    with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4)) as pool:
+        list(pool.map(lambda job: link_or_copy(*job), jobs))
 
     print(f"Dataset split complete:")
     print(f"Training samples: {len(train_ids)}")
@@ -5,12 +5,13 @@ from diffusers import StableDiffusionControlNetPipeline, ControlNetModel
 from diffusers import UniPCMultistepScheduler
 
 
-def load_image(image_path):
+def load_image(image_path, device="cuda"):
     image = Image.open(image_path)
     image = image.convert("RGB")
-    image = np.array(image)
-    image = torch.from_numpy(image).float() / 127.5 - 1
-    return image.permute(2, 0, 1).unsqueeze(0)
+    # Transfer uint8 and scale to [-1, 1] in fp16 on the device
+    image = torch.from_numpy(np.asarray(image)).to(device, non_blocking=True)
+    image = image.permute(2, 0, 1).unsqueeze(0)
+    return image.to(torch.float16).div_(127.5).sub_(1)
 
 
 def test_model(
@@ -2,25 +2,40 @@ import torch
 from transformers import CLIPTextModel, CLIPTokenizer
 from diffusers import ControlNetModel
 from PIL import Image
-from diffusers import StableDiffusionControlNetPipeline
+from diffusers import StableDiffusionControlNetPipeline, UniPCMultistepScheduler
 
 import numpy as np
+import hashlib
+from pathlib import Path
 
 device = "cuda"
 
-# 1. Load the correct CLIP text encoder & tokenizer for SD1.x (768-dim)
-tokenizer = CLIPTokenizer.from_pretrained("openai/clip-vit-large-patch14")
-text_encoder = CLIPTextModel.from_pretrained("openai/clip-vit-large-patch14").to(device)
-
-# 2. Tokenize and encode your prompt -> shape [batch_size, seq_len, 768]
+text_encoder_id = "openai/clip-vit-large-patch14"
 prompt = "A non-photo-realistic road network map."
-text_inputs = tokenizer(prompt, return_tensors="pt")
-text_inputs = {k: v.to(device) for k, v in text_inputs.items()}
-
-with torch.no_grad():
-    encoder_hidden_states = text_encoder(text_inputs["input_ids"])[0]
-    encoder_hidden_states = encoder_hidden_states.to(dtype=torch.float16)
-    # encoder_hidden_states.shape == [1, seq_len, 768]
+# Keyed by encoder and prompt, so editing either never loads stale embeddings
+cache_key = hashlib.sha1(f"{text_encoder_id}\n{prompt}".encode()).hexdigest()[:12]
+embeddings_cache = Path(f"prompt_embeds_{cache_key}.pt")
+
+if embeddings_cache.exists():
+    # Same prompt and encoder as a previous run; skip loading CLIP entirely
+    encoder_hidden_states = torch.load(embeddings_cache, map_location=device)
+else:
+    # 1. Load the correct CLIP text encoder & tokenizer for SD1.x (768-dim)
+    tokenizer = CLIPTokenizer.from_pretrained(text_encoder_id)
+    text_encoder = CLIPTextModel.from_pretrained(text_encoder_id).to(device)
+
+    # 2. Tokenize and encode your prompt -> shape [batch_size, seq_len, 768]
+    text_inputs = tokenizer(prompt, return_tensors="pt")
+    text_inputs = {k: v.to(device) for k, v in text_inputs.items()}
+
+    with torch.no_grad():
+        encoder_hidden_states = text_encoder(text_inputs["input_ids"])[0]
+        encoder_hidden_states = encoder_hidden_states.to(dtype=torch.float16)
+        # encoder_hidden_states.shape == [1, seq_len, 768]
+
+    torch.save(encoder_hidden_states.cpu(), embeddings_cache)
+    del text_encoder, tokenizer
+    torch.cuda.empty_cache()
 
 # 3. Load ControlNet
 controlnet = ControlNetModel.from_pretrained(
@@ -30,17 +45,16 @@ controlnet.eval()
 
 
 # 4. Create or load your control image (3 channels). Must match model.dtype (float16).
-def load_mlsd_image(path):
+#    uint8 goes over the bus (4x fewer bytes than fp32); normalize on the GPU.
+def load_mlsd_image(path, device=device):
     img = Image.open(path).convert("RGB").resize((1024, 1024))
-    img_arr = np.array(img).astype(np.float32) / 255.0
-    tensor = torch.from_numpy(img_arr).permute(2, 0, 1).unsqueeze(0)
-    return tensor
+    tensor = torch.from_numpy(np.asarray(img)).to(device, non_blocking=True)
+    tensor = tensor.permute(2, 0, 1).unsqueeze(0)
+    return tensor.to(torch.float16).mul_(1.0 / 255.0)
 
 
 control_image = load_mlsd_image("dataset/val/control/Seoul_2.png")
 
-control_image = control_image.to(device, dtype=torch.float16)
-
 # 5. Prepare latents (example size)
 latents = torch.randn((1, 4, 128, 128), device="cuda", dtype=torch.float16)
 
@@ -54,14 +68,18 @@ with torch.no_grad():
         conditioning_scale=1.0,
     )
 
-controlnet = ControlNetModel.from_pretrained(
-    "lllyasviel/sd-controlnet-mlsd", torch_dtype=torch.float16
-).to("cuda")
-
+# Reuse the ControlNet loaded above rather than loading a second copy
 pipe = StableDiffusionControlNetPipeline.from_pretrained(
     "runwayml/stable-diffusion-v1-5", controlnet=controlnet, torch_dtype=torch.float16
 ).to("cuda")
 
+# Use efficient attention and decode the VAE one image at a time
+pipe.enable_xformers_memory_efficient_attention()
+pipe.enable_vae_slicing()
+
+# Use better scheduler (same as scripts/test_model.py)
+pipe.scheduler = UniPCMultistepScheduler.from_config(pipe.scheduler.config)
+
 # Inference
 image = pipe(
     "A non-photo-realistic road network map.",
@@ -1,7 +1,6 @@
 import tensorflow as tf
 import wandb
 from datetime import datetime
-import numpy as np
 from pathlib import Path
 import yaml
 from typing import Tuple, Dict
@@ -25,6 +24,10 @@ class RoadNetworkTrainer:
         self.policy = tf.keras.mixed_precision.Policy("mixed_float16")
         tf.keras.mixed_precision.set_global_policy(self.policy)
 
+        # Default (single-device) strategy unless one is already in scope;
+        # used to distribute the dataset and run the train step
+        self.strategy = tf.distribute.get_strategy()
+
         # Create models
         self.generator = self.create_generator()
         self.discriminator = self.create_discriminator()
@@ -37,6 +40,10 @@ class RoadNetworkTrainer:
             learning_rate=self.create_lr_schedule("discriminator"), beta_1=0.5
         )
 
+        # Running epoch losses, kept on device and read once per epoch
+        self.gen_loss_mean = tf.keras.metrics.Mean()
+        self.disc_loss_mean = tf.keras.metrics.Mean()
+
         # Setup checkpointing
         self.checkpoint = tf.train.Checkpoint(
             generator_optimizer=self.generator_optimizer,
@@ -73,7 +80,7 @@ class RoadNetworkTrainer:
             initial_lr, decay_steps, decay_rate
         )
 
-    @tf.function
+    @tf.function(jit_compile=True, reduce_retracing=True)
     def train_step(
         self, input_image: tf.Tensor, target: tf.Tensor
     ) -> Tuple[tf.Tensor, tf.Tensor]:
@@ -110,25 +117,46 @@ class RoadNetworkTrainer:
 
         return gen_loss, disc_loss
 
+    @tf.function
+    def train_epoch(self, iterator, steps: tf.Tensor):
+        """Run one epoch of train steps in graph mode, with no per-batch Python"""
+        for _ in tf.range(steps):
+            batch = next(iterator)
+            g_loss, d_loss = self.strategy.run(
+                self.train_step, args=(batch["sketch"], batch["target"])
+            )
+            mean = tf.distribute.ReduceOp.MEAN
+            self.gen_loss_mean.update_state(
+                self.strategy.reduce(mean, g_loss, axis=None)
+            )
+            self.disc_loss_mean.update_state(
+                self.strategy.reduce(mean, d_loss, axis=None)
+            )
+
     def train(self, dataset: tf.data.Dataset, epochs: int):
         """Training loop"""
+        steps_per_epoch = dataset.cardinality()
+        if steps_per_epoch == tf.data.UNKNOWN_CARDINALITY:
+            # Count the batches once when tf.data can't infer it
+            steps_per_epoch = dataset.reduce(
+                tf.constant(0, tf.int64), lambda count, _: count + 1
+            )
+        distributed_dataset = self.strategy.experimental_distribute_dataset(dataset)
+
         for epoch in range(epochs):
             print(f"\nEpoch {epoch + 1}/{epochs}")
 
             # Train
-            gen_losses = []
-            disc_losses = []
-            for batch in dataset:
-                g_loss, d_loss = self.train_step(batch["sketch"], batch["target"])
-                gen_losses.append(g_loss)
-                disc_losses.append(d_loss)
+            self.train_epoch(iter(distributed_dataset), steps_per_epoch)
 
             # Log metrics
             metrics = {
-                "generator_loss": float(np.mean(gen_losses)),
-                "discriminator_loss": float(np.mean(disc_losses)),
+                "generator_loss": float(self.gen_loss_mean.result()),
+                "discriminator_loss": float(self.disc_loss_mean.result()),
                 "epoch": epoch,
             }
+            self.gen_loss_mean.reset_state()
+            self.disc_loss_mean.reset_state()
             wandb.log(metrics)
 
             # Save checkpoint
@@ -160,72 +188,113 @@ class DataAugmentation:
     def __init__(self, config: Dict):
         self.config = config
 
-    @tf.function
-    def augment(
+    def augment_batch(
         self, sketch: tf.Tensor, target: tf.Tensor
     ) -> Tuple[tf.Tensor, tf.Tensor]:
-        """Apply augmentation to training pairs"""
-        # Random rotation
-        if tf.random.uniform([]) < self.config["augmentation"]["rotation_prob"]:
-            angle = tf.random.uniform(
-                [],
-                minval=-self.config["augmentation"]["max_rotation"],
-                maxval=self.config["augmentation"]["max_rotation"],
-            )
-            sketch = tfa.image.rotate(sketch, angle)
-            target = tfa.image.rotate(target, angle)
+        """Apply augmentation to a batch of training pairs [B, H, W, C]"""
+        aug = self.config["augmentation"]
+        batch_size = tf.shape(sketch)[0]
+        sketch_channels = tf.shape(sketch)[-1]
+
+        # Geometric ops run on sketch and target stacked along channels, so
+        # each pair stays aligned
+        pair = tf.concat([sketch, target], axis=-1)
+
+        # Random rotation, drawn per example
+        rotate = tf.random.uniform([batch_size]) < aug["rotation_prob"]
+        angles = tf.random.uniform(
+            [batch_size], minval=-aug["max_rotation"], maxval=aug["max_rotation"]
+        )
+        pair = self.rotate_images(pair, tf.where(rotate, angles, 0.0))
 
         # Random flip
-        if tf.random.uniform([]) < self.config["augmentation"]["flip_prob"]:
-            sketch = tf.image.random_flip_left_right(sketch)
-            target = tf.image.random_flip_left_right(target)
+        flip = tf.random.uniform([batch_size, 1, 1, 1]) < aug["flip_prob"]
+        pair = tf.where(flip, tf.image.random_flip_left_right(pair), pair)
+
+        sketch = pair[..., :sketch_channels]
+        target = pair[..., sketch_channels:]
 
         # Random brightness/contrast (only for target)
-        if tf.random.uniform([]) < self.config["augmentation"]["brightness_prob"]:
-            target = tf.image.random_brightness(target, 0.2)
-            target = tf.image.random_contrast(target, 0.8, 1.2)
+        jitter = tf.random.uniform([batch_size, 1, 1, 1]) < aug["brightness_prob"]
+        delta = tf.random.uniform([batch_size, 1, 1, 1], -0.2, 0.2, dtype=target.dtype)
+        factor = tf.random.uniform([batch_size, 1, 1, 1], 0.8, 1.2, dtype=target.dtype)
+        jittered = target + delta
+        # Reduce in fp32; a 512x512 fp16 sum loses precision
+        mean = tf.reduce_mean(tf.cast(jittered, tf.float32), axis=[1, 2], keepdims=True)
+        mean = tf.cast(mean, target.dtype)
+        jittered = (jittered - mean) * factor + mean
+        target = tf.where(jitter, jittered, target)
 
         return sketch, target
 
+    @staticmethod
+    def rotate_images(images: tf.Tensor, angles: tf.Tensor) -> tf.Tensor:
+        """Rotate each image about its centre by its angle (radians)"""
+        height = tf.cast(tf.shape(images)[1], tf.float32)
+        width = tf.cast(tf.shape(images)[2], tf.float32)
+        cos, sin = tf.cos(angles), tf.sin(angles)
+        x_offset = ((width - 1) - (cos * (width - 1) - sin * (height - 1))) / 2
+        y_offset = ((height - 1) - (sin * (width - 1) + cos * (height - 1))) / 2
+        zeros = tf.zeros_like(angles)
+        # Output-to-input projective transforms, one row per image
+        transforms = tf.stack(
+            [cos, -sin, x_offset, sin, cos, y_offset, zeros, zeros], axis=1
+        )
+
+        return tf.raw_ops.ImageProjectiveTransformV3(
+            images=images,
+            transforms=transforms,
+            output_shape=tf.shape(images)[1:3],
+            fill_value=0.0,
+            interpolation="BILINEAR",
+            fill_mode="CONSTANT",
+        )
+
 
 def create_dataset(data_dir: str, config: Dict) -> tf.data.Dataset:
     """Create training dataset with augmentation"""
     augmenter = DataAugmentation(config)
 
     def load_image_pair(path: str) -> Dict[str, tf.Tensor]:
-        # Load and preprocess image pair
-        image = tf.io.read_file(path)
-        image = tf.image.decode_png(image, channels=1)
-        image = tf.cast(image, tf.float32)
-
-        # Split into sketch and target
-        width = tf.shape(image)[1]
-        sketch = image[:, : width // 2, :]
-        target = image[:, width // 2 :, :]
+        # Load and normalize the image pair in one pass. fp16 halves the cached
+        # dataset and matches the mixed_float16 policy
+        image = tf.image.decode_png(tf.io.read_file(path), channels=1, dtype=tf.uint8)
+        image = tf.cast(image, tf.float16) * (1.0 / 127.5) - 1.0
 
-        # Normalize
-        sketch = (sketch / 127.5) - 1
-        target = (target / 127.5) - 1
+        # Split into sketch and target halves
+        sketch, target = tf.split(image, 2, axis=1)
 
-        # Augment
-        sketch, target = augmenter.augment(sketch, target)
+        return {"sketch": sketch, "target": target}
 
+    def augment_pairs(batch: Dict[str, tf.Tensor]) -> Dict[str, tf.Tensor]:
+        sketch, target = augmenter.augment_batch(batch["sketch"], batch["target"])
         return {"sketch": sketch, "target": target}
 
-    # Create dataset
+    # Create dataset. Decoded pairs are cached on disk after the first epoch;
+    # augmentation runs on whole batches after the cache so it still varies
+    # per epoch. The cache name carries the dtype so an older float32 cache
+    # is never read back as float16
     dataset = tf.data.Dataset.list_files(str(Path(data_dir) / "pairs" / "*.png"))
     dataset = dataset.map(load_image_pair, num_parallel_calls=tf.data.AUTOTUNE)
+    dataset = dataset.cache(filename=str(Path(data_dir) / "tfdata_f16.cache"))
     dataset = dataset.shuffle(config["training"]["buffer_size"])
     dataset = dataset.batch(config["training"]["batch_size"])
+    dataset = dataset.map(augment_pairs, num_parallel_calls=tf.data.AUTOTUNE)
     dataset = dataset.prefetch(tf.data.AUTOTUNE)
 
+    # Favor throughput: parallelize fused maps and let elements arrive out of
+    # order (the data is shuffled anyway)
+    options = tf.data.Options()
+    options.experimental_optimization.map_parallelization = True
+    options.deterministic = False
+    dataset = dataset.with_options(options)
+
     return dataset
 
 
 if __name__ == "__main__":
     import argparse
     import tensorflow as tf
-    import tensorflow_addons as tfa
 
     parser = argparse.ArgumentParser(description="Train Road Network GAN")
     parser.add_argument(